@@ -0,0 +1,57 @@
+/* ------------------------------------------------------------------------
+ * Noyau de recherche du neurone vainqueur (BMU) en C avec intrinsèques AVX2
+ *
+ * Compilation (la bibliothèque est chargée dynamiquement par kohonen.py,
+ * son absence est sans conséquence : repli sur numba puis NumPy) :
+ *
+ *     gcc -O3 -mavx2 -mfma -shared -fPIC -o libbmu_avx2.so bmu_avx2.c
+ *
+ * Sans -mavx2/-mfma (ou sur une autre architecture), le noyau retombe sur
+ * la boucle scalaire, que le compilateur auto-vectorise en général.
+ * ------------------------------------------------------------------------ */
+#include <stddef.h>
+#if defined(__AVX2__) && defined(__FMA__)
+#include <immintrin.h>
+#endif
+
+/* Balayage des HW vecteurs de poids (contigus, D composantes float32) :
+ * distance au carré à l'entrée x accumulée par FMA sur 8 voies, minimum
+ * courant conservé pendant la même passe. */
+void bmu(const float *W, const float *x, int HW, int D, int *out_idx, float *out_min)
+{
+    float best = 3.402823466e+38f;
+    int best_i = 0;
+    int n;
+    for (n = 0; n < HW; n++) {
+        const float *w = W + (size_t)n * (size_t)D;
+        float d = 0.0f;
+        int k = 0;
+#if defined(__AVX2__) && defined(__FMA__)
+        __m256 acc = _mm256_setzero_ps();
+        for (; k + 8 <= D; k += 8) {
+            __m256 diff = _mm256_sub_ps(_mm256_loadu_ps(w + k), _mm256_loadu_ps(x + k));
+            acc = _mm256_fmadd_ps(diff, diff, acc);
+        }
+        /* Réduction horizontale des 8 voies */
+        {
+            __m128 lo = _mm256_castps256_ps128(acc);
+            __m128 hi = _mm256_extractf128_ps(acc, 1);
+            lo = _mm_add_ps(lo, hi);
+            lo = _mm_hadd_ps(lo, lo);
+            lo = _mm_hadd_ps(lo, lo);
+            d = _mm_cvtss_f32(lo);
+        }
+#endif
+        /* Queue scalaire (et chemin complet pour D < 8 ou sans AVX2) */
+        for (; k < D; k++) {
+            float t = w[k] - x[k];
+            d += t * t;
+        }
+        if (d < best) {
+            best = d;
+            best_i = n;
+        }
+    }
+    *out_idx = best_i;
+    *out_min = best;
+}
@@ -14,6 +14,25 @@ from __future__ import division
 import numpy
 # Librairie d'affichage
 import matplotlib.pyplot as plt
+# Collection de segments (trace toute la grille en un seul artiste matplotlib)
+from matplotlib.collections import LineCollection
+# Compilation JIT des noyaux de calcul critiques (facultative : on retombe sur NumPy si numba est absent)
+try:
+  from numba import njit, prange, get_num_threads, get_thread_id
+  _NUMBA_OK = True
+except ImportError:
+  _NUMBA_OK = False
+# Noyau BMU en C + intrinsèques AVX2 (facultatif : compilé séparément, voir bmu_avx2.c)
+import ctypes
+import os
+try:
+  _bmu_ext = ctypes.CDLL(os.path.join(os.path.dirname(os.path.abspath(__file__)),'libbmu_avx2.so'))
+  _bmu_ext.bmu.argtypes = [ctypes.c_void_p,ctypes.c_void_p,ctypes.c_int,ctypes.c_int,
+                           ctypes.POINTER(ctypes.c_int),ctypes.POINTER(ctypes.c_float)]
+  _bmu_ext.bmu.restype = None
+  _BMU_EXT_OK = True
+except OSError:
+  _BMU_EXT_OK = False
 
 
 
@@ -30,8 +49,8 @@ class Neuron:
     @param posy: position en y du neurone dans la carte
     @type posy: int
     '''
-    # Initialisation des poids
-    self.weights = w.flatten()
+    # Initialisation des poids (vue sur le tenseur de poids de la carte, pas une copie)
+    self.weights = w.reshape(-1)
     # Initialisation de la position
     self.posx = posx
     self.posy = posy
@@ -45,7 +64,10 @@ class Neuron:
     @type x: numpy array
     '''
     # On calcule la distance entre le poids du neurone et l'entrée
-    self.y = numpy.linalg.norm(self.weights - x.flatten())
+    # (ravel renvoie une vue : pas de copie de l'entrée à chaque appel ;
+    # produit scalaire bien plus léger que numpy.linalg.norm pour un petit vecteur)
+    d = self.weights - x.ravel()
+    self.y = numpy.sqrt(d.dot(d))
 
   def learn(self,eta,sigma,posxjetoile,posyjetoile,x):
     '''
@@ -64,7 +86,151 @@ class Neuron:
     # Calcul de la distance entre le neurone et le neurone gagnant
     dist = (self.posx - posxjetoile)**2 + (self.posy - posyjetoile)**2
     h = numpy.exp(-dist / (2 * sigma * sigma))
-    self.weights[:] = self.weights[:] + eta * h * (x.flatten() - self.weights)
+    self.weights[:] = self.weights[:] + eta * h * (x.ravel() - self.weights)
+
+
+if _NUMBA_OK:
+  @njit(fastmath=True, cache=True, boundscheck=False)
+  def _bmu_njit(W,x):
+    ''' Recherche du neurone vainqueur : une seule passe sur les poids, distances au carré et minimum fusionnés. '''
+    best = numpy.inf
+    bi = 0
+    bj = 0
+    for i in range(W.shape[0]):
+      for j in range(W.shape[1]):
+        d = 0.
+        for k in range(W.shape[2]):
+          t = W[i,j,k] - x[k]
+          d += t*t
+        if d < best:
+          best = d
+          bi = i
+          bj = j
+    return bi,bj,best
+
+  @njit(fastmath=True, cache=True, boundscheck=False)
+  def _train_step_njit(W,W_sqnorm,x,eta,two_sigma2):
+    ''' Pas d'apprentissage complet fusionné : le vainqueur est suivi par un minimum courant pendant la passe de
+    distances (aucune carte d'activité intermédiaire), puis la mise à jour de Kohonen et le rafraîchissement des
+    normes au carré se font dans la même fonction compilée. Renvoie la position du vainqueur. '''
+    # Recherche du vainqueur : minimum courant fusionné dans le calcul des distances
+    best = numpy.inf
+    jx = 0
+    jy = 0
+    for i in range(W.shape[0]):
+      for j in range(W.shape[1]):
+        d = 0.
+        for k in range(W.shape[2]):
+          t = W[i,j,k] - x[k]
+          d += t*t
+        if d < best:
+          best = d
+          jx = i
+          jy = j
+    # Mise à jour de Kohonen en place, normes au carré rafraîchies dans la même passe
+    for i in range(W.shape[0]):
+      for j in range(W.shape[1]):
+        a = eta * numpy.exp(-((i-jx)**2 + (j-jy)**2) / two_sigma2)
+        s = 0.
+        for k in range(W.shape[2]):
+          w = W[i,j,k] + a * (x[k] - W[i,j,k])
+          W[i,j,k] = w
+          s += w*w
+        W_sqnorm[i*W.shape[1]+j] = s
+    return jx,jy
+
+
+def _grille_segments(w):
+  '''
+  @summary: Construit la liste des segments reliant les neurones voisins d'une grille de poids 2d, pour affichage en une seule LineCollection
+  @param w: poids de la carte restreints à deux dimensions d'entrée (tableau (H, W, 2))
+  @type w: numpy array
+  '''
+  # Segments horizontaux (le long des lignes) et verticaux (le long des colonnes)
+  segs_h = numpy.stack((w[:,:-1],w[:,1:]),axis=2).reshape(-1,2,2)
+  segs_v = numpy.stack((w[:-1,:],w[1:,:]),axis=2).reshape(-1,2,2)
+  return numpy.concatenate((segs_h,segs_v))
+
+
+if _NUMBA_OK:
+  # Au-delà de cette dimension d'entrée, le déroulage complet n'apporte plus rien : on garde le noyau générique
+  _SPEC_MAX_D = 8
+  # Cache des noyaux spécialisés déjà générés, indexé par dimension d'entrée
+  _SPEC_KERNELS = {}
+
+  def _noyau_specialise(D):
+    ''' Génère (et met en cache) un pas d'apprentissage compilé spécialisé pour une dimension d'entrée donnée :
+    la boucle interne sur les composantes est entièrement déroulée dans le source avant compilation, numba
+    n'émet alors plus que des chaînes d'instructions FMA sans boucle. '''
+    if D not in _SPEC_KERNELS:
+      lines = ['def _train_step_spec(W,W_sqnorm,x,eta,two_sigma2):',
+               '  best = numpy.inf',
+               '  jx = 0',
+               '  jy = 0',
+               '  for i in range(W.shape[0]):',
+               '    for j in range(W.shape[1]):']
+      for k in range(D):
+        lines.append('      t%d = W[i,j,%d] - x[%d]' % (k,k,k))
+      lines.append('      d = ' + ' + '.join('t%d*t%d' % (k,k) for k in range(D)))
+      lines += ['      if d < best:',
+                '        best = d',
+                '        jx = i',
+                '        jy = j',
+                '  for i in range(W.shape[0]):',
+                '    for j in range(W.shape[1]):',
+                '      a = eta * numpy.exp(-((i-jx)**2 + (j-jy)**2) / two_sigma2)']
+      for k in range(D):
+        lines.append('      w%d = W[i,j,%d] + a * (x[%d] - W[i,j,%d])' % (k,k,k,k))
+        lines.append('      W[i,j,%d] = w%d' % (k,k))
+      lines.append('      W_sqnorm[i*W.shape[1]+j] = ' + ' + '.join('w%d*w%d' % (k,k) for k in range(D)))
+      env = {'numpy': numpy}
+      exec(compile('\n'.join(lines),'<noyau_specialise_D%d>' % D,'exec'),env)
+      _SPEC_KERNELS[D] = njit(fastmath=True, boundscheck=False)(env['_train_step_spec'])
+    return _SPEC_KERNELS[D]
+
+  # (pas de cache=True ici : numba ne sait pas mettre en cache les fonctions parallèles)
+  @njit(parallel=True, fastmath=True, boundscheck=False)
+  def _batch_step_njit(W,Xb,eta,two_sigma2):
+    ''' Pas d'apprentissage sur un mini-lot, parallélisé sur les exemples : chaque thread calcule le vainqueur et
+    la mise à jour partielle de ses exemples dans son propre accumulateur, puis les accumulateurs sont réduits et
+    la moyenne du lot est appliquée aux poids en place. '''
+    H = W.shape[0]
+    Wd = W.shape[1]
+    D = W.shape[2]
+    B = Xb.shape[0]
+    # Un accumulateur de deltas par thread (pas d'écriture concurrente sur W)
+    nthreads = get_num_threads()
+    deltas = numpy.zeros((nthreads,H,Wd,D),dtype=W.dtype)
+    for b in prange(B):
+      tid = get_thread_id()
+      # Recherche du vainqueur de l'exemple b (minimum courant)
+      best = numpy.inf
+      jx = 0
+      jy = 0
+      for i in range(H):
+        for j in range(Wd):
+          d = 0.
+          for k in range(D):
+            t = W[i,j,k] - Xb[b,k]
+            d += t*t
+          if d < best:
+            best = d
+            jx = i
+            jy = j
+      # Contribution de l'exemple b à la mise à jour du lot
+      for i in range(H):
+        for j in range(Wd):
+          a = eta * numpy.exp(-((i-jx)**2 + (j-jy)**2) / two_sigma2)
+          for k in range(D):
+            deltas[tid,i,j,k] += a * (Xb[b,k] - W[i,j,k])
+    # Réduction des accumulateurs et application de la moyenne du lot
+    for i in range(H):
+      for j in range(Wd):
+        for k in range(D):
+          s = 0.
+          for t in range(nthreads):
+            s += deltas[t,i,j,k]
+          W[i,j,k] += s/B
 
 
 class SOM:
@@ -83,25 +249,48 @@ class SOM:
     # Initialisation de la taille de la carte
     self.gridsize = gridsize
     # Création de la carte
-    # Carte de neurones
-    self.map = []    
-    # Carte des poids
-    self.weightsmap = []
+    # Tenseur des poids : un seul tableau contigu (H, W, D) plutôt qu'une grille d'objets Neuron
+    # (en float32 : la précision double est inutile ici et la simple précision double le débit SIMD)
+    self.W = numpy.random.random((gridsize[0],gridsize[1],int(numpy.prod(inputsize)))).astype(numpy.float32)
     # Carte des activités
-    self.activitymap = []
-    for posx in range(gridsize[0]):
-      mline = []
-      wmline = []
-      amline = []
-      for posy in range(gridsize[1]):
-        neuron = Neuron(numpy.random.random(self.inputsize),posx,posy)
-        mline.append(neuron)
-        wmline.append(neuron.weights)
-        amline.append(neuron.y)
-      self.map.append(mline)
-      self.weightsmap.append(wmline)
-      self.activitymap.append(amline)
-    self.activitymap = numpy.array(self.activitymap)
+    self.activitymap = numpy.zeros(gridsize)
+    # Grilles des positions des neurones (précalculées pour la mise à jour vectorisée)
+    self.PX,self.PY = numpy.meshgrid(numpy.arange(gridsize[0]),numpy.arange(gridsize[1]),indexing='ij')
+    # Vue aplatie des poids (H*W, D) pour le calcul des distances par produit matriciel
+    self.W_flat = self.W.reshape(-1,self.W.shape[2])
+    # Normes au carré des poids, maintenues incrémentalement après chaque apprentissage
+    self.W_sqnorm = numpy.einsum('nk,nk->n',self.W_flat,self.W_flat)
+    # Table des noyaux de voisinage, construite paresseusement pour le sigma courant
+    self._ker_sigma = None
+    self._KER = None
+    # Tampons de travail réutilisés par compute (aucune allocation par pas de temps)
+    self._dot = numpy.empty(self.W_flat.shape[0],dtype=self.W.dtype)
+    self._d2 = numpy.empty(self.W_flat.shape[0],dtype=self.W.dtype)
+    # Noyau de pas d'apprentissage : version spécialisée (boucle interne déroulée) pour les petites dimensions d'entrée
+    if _NUMBA_OK:
+      self._pas_njit = _noyau_specialise(self.W.shape[2]) if self.W.shape[2] <= _SPEC_MAX_D else _train_step_njit
+
+  def _noyau_voisinage(self,sigma):
+    '''
+    @summary: Renvoie la table (H, W, H, W) des noyaux de voisinage exp(-d²/(2σ²)) pour toutes les positions possibles du neurone gagnant ; elle n'est reconstruite que quand sigma change
+    @param sigma: largeur du voisinage
+    @type sigma: float
+    '''
+    if self._ker_sigma != sigma:
+      # KER[jx,jy] est le noyau complet de la carte pour un vainqueur en (jx,jy)
+      i = numpy.arange(self.gridsize[0])
+      j = numpy.arange(self.gridsize[1])
+      dist = (i[:,None,None,None]-i[None,None,:,None])**2 + (j[None,:,None,None]-j[None,None,None,:])**2
+      self._KER = numpy.exp(-dist / (2 * sigma * sigma)).astype(self.W.dtype)
+      self._ker_sigma = sigma
+    return self._KER
+
+  @property
+  def weightsmap(self):
+    '''
+    @summary: Poids de la carte sous forme de tenseur (H, W, D), conservé pour compatibilité avec le code d'affichage et de diagnostic
+    '''
+    return self.W
 
   def compute(self,x):
     '''
@@ -109,11 +298,17 @@ class SOM:
     @param x: entrée de la carte (identique pour chaque neurone)
     @type x: numpy array
     '''
-    # On demande à chaque neurone de calculer son activité et on met à jour la carte d'activité de la carte
-    for posx in range(self.gridsize[0]):
-      for posy in range(self.gridsize[1]):
-        self.map[posx][posy].compute(x)
-        self.activitymap[posx][posy] = self.map[posx][posy].y
+    # On calcule la distance au carré entre chaque poids et l'entrée via l'identité
+    # ||w-x||² = ||w||² - 2 w·x + ||x||², ce qui ramène le balayage à un produit matrice-vecteur (BLAS)
+    # (le sqrt est inutile : argmin et min sont invariants par une fonction croissante)
+    xf = numpy.asarray(x.ravel(),dtype=self.W.dtype)
+    # Produit W·x écrit dans le tampon préalloué (matmul appelle déjà le GEMV du BLAS sur ces tableaux)
+    numpy.matmul(self.W_flat,xf,out=self._dot)
+    # Assemblage des distances au carré dans le second tampon, sans tableau intermédiaire
+    numpy.multiply(self._dot,-2.0,out=self._d2)
+    self._d2 += self.W_sqnorm
+    self._d2 += xf.dot(xf)
+    self.activitymap = self._d2.reshape(self.gridsize)
 
   def learn(self,eta,sigma,x):
     '''
@@ -127,13 +322,84 @@ class SOM:
     '''
     # Calcul du neurone vainqueur
     jetoilex,jetoiley = numpy.unravel_index(numpy.argmin(self.activitymap),self.gridsize)
-    # Mise à jour des poids de chaque neurone
-    for posx in range(self.gridsize[0]):
-      for posy in range(self.gridsize[1]):
-        self.map[posx][posy].learn(eta,sigma,jetoilex,jetoiley,x)
+    # Noyau de voisinage lu dans la table précalculée (simple accès mémoire, aucun exp)
+    h = self._noyau_voisinage(sigma)[jetoilex,jetoiley]
+    # Mise à jour des poids de tous les neurones en une seule opération vectorisée
+    xf = x.ravel()
+    x_sq = xf.dot(xf)
+    a = (eta*h).astype(self.W.dtype)
+    # Produit scalaire w·x retrouvé depuis la carte d'activité (d² = ||w||² - 2 w·x + ||x||²)
+    old_sqnorm = self.W_sqnorm.reshape(self.gridsize)
+    wx = 0.5 * (old_sqnorm + x_sq - self.activitymap)
+    self.W += a[:,:,None] * (xf - self.W)
+    # Mise à jour incrémentale des normes : w' = (1-a) w + a x donc ||w'||² = (1-a)²||w||² + 2a(1-a) w·x + a²||x||²
+    self.W_sqnorm = ((1-a)**2 * old_sqnorm + 2*a*(1-a)*wx + a*a*x_sq).ravel()
 
-        
-      
+  def bmu(self,x):
+    '''
+    @summary: Renvoie la position (x, y) du neurone vainqueur pour une entrée, via le noyau C AVX2 s'il est compilé, sinon le noyau numba, sinon NumPy
+    @param x: entrée de la carte
+    @type x: numpy array
+    '''
+    xf = numpy.ascontiguousarray(x.ravel(),dtype=self.W.dtype)
+    if _BMU_EXT_OK and self.W.dtype == numpy.float32:
+      idx = ctypes.c_int(0)
+      dmin = ctypes.c_float(0.)
+      _bmu_ext.bmu(self.W.ctypes.data,xf.ctypes.data,self.W_flat.shape[0],self.W_flat.shape[1],
+                   ctypes.byref(idx),ctypes.byref(dmin))
+      return numpy.unravel_index(idx.value,self.gridsize)
+    if _NUMBA_OK:
+      jetoilex,jetoiley,_ = _bmu_njit(self.W,xf)
+      return jetoilex,jetoiley
+    self.compute(xf)
+    return numpy.unravel_index(numpy.argmin(self.activitymap),self.gridsize)
+
+  def train_step(self,eta,sigma,x):
+    '''
+    @summary: Effectue un pas d'apprentissage complet (recherche du vainqueur puis mise à jour des poids) dans des noyaux compilés par numba si disponible, sinon via compute/learn
+    @param eta: taux d'apprentissage
+    @type eta: float
+    @param sigma: largeur du voisinage
+    @type sigma: float
+    @param x: entrée de la carte
+    @type x: numpy array
+    '''
+    if _NUMBA_OK:
+      xf = numpy.ascontiguousarray(x.ravel())
+      self._pas_njit(self.W,self.W_sqnorm,xf,eta,2*sigma*sigma)
+    else:
+      self.compute(x)
+      self.learn(eta,sigma,x)
+
+  def learn_batch(self,eta,sigma,X):
+    '''
+    @summary: Modifie les poids de la carte selon la règle de Kohonen, moyennée sur un mini-lot d'exemples
+    @param eta: taux d'apprentissage
+    @type eta: float
+    @param sigma: largeur du voisinage
+    @type sigma: float
+    @param X: mini-lot d'entrées (un exemple par ligne après aplatissement)
+    @type X: numpy array
+    '''
+    # Aplatissement du lot en une matrice (B, D)
+    Xb = X.reshape(X.shape[0],-1)
+    if _NUMBA_OK:
+      # Vainqueurs et mises à jour partielles calculés en parallèle sur les exemples du lot, puis réduits
+      _batch_step_njit(self.W,numpy.ascontiguousarray(Xb,dtype=self.W.dtype),eta,2*sigma*sigma)
+      # On recalcule les normes au carré (une seule passe par lot)
+      self.W_sqnorm = numpy.einsum('nk,nk->n',self.W_flat,self.W_flat)
+      return
+    # Distances au carré de tous les exemples à tous les poids en un seul produit matriciel (GEMM)
+    D2 = self.W_sqnorm[None,:] - 2.0 * (Xb @ self.W_flat.T) + numpy.einsum('bk,bk->b',Xb,Xb)[:,None]
+    # Calcul des neurones vainqueurs de tout le lot
+    jx,jy = numpy.unravel_index(D2.argmin(axis=1),self.gridsize)
+    # Noyaux de voisinage de tous les exemples du lot, lus dans la table précalculée
+    h = self._noyau_voisinage(sigma)[jx,jy]
+    # Mise à jour moyennée sur le lot : somme_b eta*h_b*(x_b - w) = eta*(somme_b h_b x_b) - eta*(somme_b h_b) w
+    a = (eta*h).astype(self.W.dtype)
+    self.W += (numpy.einsum('bij,bk->ijk',a,Xb) - a.sum(axis=0)[:,:,None]*self.W) / Xb.shape[0]
+    # La mise à jour n'est plus de rang 1 par neurone : on recalcule les normes au carré (une seule passe par lot)
+    self.W_sqnorm = numpy.einsum('nk,nk->n',self.W_flat,self.W_flat)
 
   def scatter_plot(self,interactive=False):
     '''
@@ -145,14 +411,11 @@ class SOM:
     if not interactive:
       plt.figure()
     # Récupération des poids
-    w = numpy.array(self.weightsmap)
+    w = numpy.asarray(self.weightsmap)
     # Affichage des poids
     plt.scatter(w[:,:,0].flatten(),w[:,:,1].flatten(),c='k')
-    # Affichage de la grille
-    for i in range(w.shape[0]):
-      plt.plot(w[i,:,0],w[i,:,1],'k',linewidth=1.)
-    for i in range(w.shape[1]):
-      plt.plot(w[:,i,0],w[:,i,1],'k',linewidth=1.)
+    # Affichage de la grille : tous les segments en un seul artiste au lieu d'un plt.plot par ligne/colonne
+    plt.gca().add_collection(LineCollection(_grille_segments(w[:,:,0:2]),colors='k',linewidths=1.))
     # Modification des limites de l'affichage
     plt.xlim(-1,1)
     plt.ylim(-1,1)
@@ -174,25 +437,17 @@ class SOM:
     # Affichage des 2 premières dimensions dans le plan
     plt.subplot(1,2,1)
     # Récupération des poids
-    w = numpy.array(self.weightsmap)
+    w = numpy.asarray(self.weightsmap)
     # Affichage des poids
     plt.scatter(w[:,:,0].flatten(),w[:,:,1].flatten(),c='k')
-    # Affichage de la grille
-    for i in range(w.shape[0]):
-      plt.plot(w[i,:,0],w[i,:,1],'k',linewidth=1.)
-    for i in range(w.shape[1]):
-      plt.plot(w[:,i,0],w[:,i,1],'k',linewidth=1.)
+    # Affichage de la grille : tous les segments en un seul artiste au lieu d'un plt.plot par ligne/colonne
+    plt.gca().add_collection(LineCollection(_grille_segments(w[:,:,0:2]),colors='k',linewidths=1.))
     # Affichage des 2 dernières dimensions dans le plan
     plt.subplot(1,2,2)
-    # Récupération des poids
-    w = numpy.array(self.weightsmap)
     # Affichage des poids
     plt.scatter(w[:,:,2].flatten(),w[:,:,3].flatten(),c='k')
     # Affichage de la grille
-    for i in range(w.shape[0]):
-      plt.plot(w[i,:,2],w[i,:,3],'k',linewidth=1.)
-    for i in range(w.shape[1]):
-      plt.plot(w[:,i,2],w[:,i,3],'k',linewidth=1.)
+    plt.gca().add_collection(LineCollection(_grille_segments(w[:,:,2:4]),colors='k',linewidths=1.))
     # Affichage du titre de la figure
     plt.suptitle('Poids dans l\'espace d\'entree')
     # Affichage de la figure
@@ -204,16 +459,15 @@ class SOM:
     @summary: Affichage des poids du réseau (matrice des poids)
     '''
     # Récupération des poids
-    w = numpy.array(self.weightsmap)
+    w = numpy.asarray(self.weightsmap)
     # Création de la figure
-    f,a = plt.subplots(w.shape[0],w.shape[1])    
-    # Affichage des poids dans un sous graphique (suivant sa position de la SOM)
-    for i in range(w.shape[0]):
-      for j in range(w.shape[1]):
-        plt.subplot(w.shape[0],w.shape[1],i*w.shape[1]+j+1)
-        im = plt.imshow(w[i,j].reshape(self.inputsize),interpolation='nearest',vmin=numpy.min(w),vmax=numpy.max(w),cmap='binary')
-        plt.xticks([])
-        plt.yticks([])
+    f = plt.figure()
+    # Mosaïque unique (H*h, W*l) des poids : un seul imshow au lieu d'un sous-graphique par neurone
+    h,l = self.inputsize
+    mosaic = w.reshape(self.gridsize[0],self.gridsize[1],h,l).transpose(0,2,1,3).reshape(self.gridsize[0]*h,self.gridsize[1]*l)
+    im = plt.imshow(mosaic,interpolation='nearest',vmin=numpy.min(w),vmax=numpy.max(w),cmap='binary')
+    plt.xticks([])
+    plt.yticks([])
     # Affichage de l'échelle
     f.subplots_adjust(right=0.8)
     cbar_ax = f.add_axes([0.85, 0.15, 0.05, 0.7])
@@ -229,18 +483,12 @@ class SOM:
     @param X: le jeu de données
     @type X: numpy array
     '''
-    # On récupère le nombre d'exemples
-    nsamples = X.shape[0]
-    # Somme des erreurs quadratiques
-    s = 0
-    # Pour tous les exemples du jeu de test
-    for x in X:
-      # On calcule la distance à chaque poids de neurone
-      self.compute(x.flatten())
-      # On rajoute la distance minimale au carré à la somme
-      s += numpy.min(self.activitymap)**2
-    # On renvoie l'erreur de quantification vectorielle moyenne
-    return s/nsamples
+    # Aplatissement du jeu de données en une matrice (N, D)
+    Xs = X.reshape(X.shape[0],-1)
+    # Distances au carré de tous les exemples à tous les poids en un seul produit matriciel (GEMM)
+    D2 = numpy.einsum('nk,nk->n',Xs,Xs)[:,None] + self.W_sqnorm[None,:] - 2.0 * (Xs @ self.W_flat.T)
+    # On renvoie l'erreur de quantification vectorielle moyenne (distance minimale au carré, moyennée sur les exemples)
+    return D2.min(axis=1).mean()
 
 def distorsion_locale_moyenne(network):
     '''
@@ -248,19 +496,12 @@ def distorsion_locale_moyenne(network):
     @param network: une instance de SOM
     @return: valeur moyenne des distances entre les poids de neurones voisins
     '''
-    w = numpy.array(network.weightsmap)
-    total = 0
-    count = 0
-    for i in range(network.gridsize[0]):
-        for j in range(network.gridsize[1]):
-            current = w[i][j]
-            # voisins droite et bas (pour éviter double comptage)
-            if i + 1 < network.gridsize[0]:
-                total += numpy.linalg.norm(current - w[i+1][j])**2
-                count += 1
-            if j + 1 < network.gridsize[1]:
-                total += numpy.linalg.norm(current - w[i][j+1])**2
-                count += 1
+    w = numpy.asarray(network.weightsmap)
+    # Différences entre voisins bas et droite par tranches de tableau (chaque arête comptée une fois, aucune boucle Python)
+    dh = w[1:] - w[:-1]
+    dv = w[:,1:] - w[:,:-1]
+    total = (dh*dh).sum() + (dv*dv).sum()
+    count = dh.shape[0]*dh.shape[1] + dv.shape[0]*dv.shape[1]
     return total / count
 
 def compute_local_roughness(weight_grid):
@@ -275,26 +516,14 @@ def compute_local_roughness(weight_grid):
         float : la rugosité moyenne de la carte.
     """
     height, width, dim = weight_grid.shape
-    total_roughness = 0
-    count = 0
-
-    # Parcours de chaque neurone
-    for i in range(height):
-        for j in range(width):
-            w_ij = weight_grid[i, j]
-            neighbors = []
-
-            # Voisins 4-connectés (haut, bas, gauche, droite)
-            if i > 0: neighbors.append(weight_grid[i - 1, j])
-            if i < height - 1: neighbors.append(weight_grid[i + 1, j])
-            if j > 0: neighbors.append(weight_grid[i, j - 1])
-            if j < width - 1: neighbors.append(weight_grid[i, j + 1])
-
-            # Calcul des distances aux voisins
-            for w_neighbor in neighbors:
-                dist_sq = numpy.linalg.norm(w_ij - w_neighbor)**2
-                total_roughness += dist_sq
-                count += 1
+
+    # Distances au carré entre voisins verticaux et horizontaux, par tranches de tableau
+    dh2 = ((weight_grid[1:] - weight_grid[:-1])**2).sum(axis=-1)
+    dv2 = ((weight_grid[:, 1:] - weight_grid[:, :-1])**2).sum(axis=-1)
+
+    # Chaque arête interne est vue deux fois (une fois par neurone), comme dans le parcours 4-connecté
+    total_roughness = 2 * (dh2.sum() + dv2.sum())
+    count = 2 * (dh2.size + dv2.size)
 
     return total_roughness / count if count > 0 else 0
 
@@ -312,6 +541,8 @@ if __name__ == '__main__':
   SIGMA = 1.4
   # Nombre de pas de temps d'apprentissage
   N = 30000
+  # Taille des mini-lots (nombre d'exemples traités par itération)
+  B = 32
   # Affichage interactif de l'évolution du réseau 
   #TODO à mettre à faux pour que les simulations aillent plus vite
   VERBOSE = True
@@ -322,20 +553,21 @@ if __name__ == '__main__':
   # TODO décommenter les données souhaitées
   nsamples = 1200
   # Ensemble de données 1
-  samples = numpy.random.random((nsamples,2,1))*2-1
+  # (en float32 comme les poids, pour rester sur les noyaux simple précision)
+  samples = (numpy.random.random((nsamples,2,1))*2-1).astype(numpy.float32)
   # Ensemble de données 2
 #  samples1 = -numpy.random.random((nsamples//3,2,1))
 #  samples2 = numpy.random.random((nsamples//3,2,1))
 #  samples2[:,0,:] -= 1
 #  samples3 = numpy.random.random((nsamples//3,2,1))
 #  samples3[:,1,:] -= 1
-#  samples = numpy.concatenate((samples1,samples2,samples3))
+#  samples = numpy.concatenate((samples1,samples2,samples3)).astype(numpy.float32)
   # Ensemble de données 3
 #  samples1 = numpy.random.random((nsamples//2,2,1))
 #  samples1[:,0,:] -= 1
 #  samples2 = numpy.random.random((nsamples//2,2,1))
 #  samples2[:,1,:] -= 1
-#  samples = numpy.concatenate((samples1,samples2))
+#  samples = numpy.concatenate((samples1,samples2)).astype(numpy.float32)
   # Ensemble de données robotiques
 #  samples = numpy.random.random((nsamples,4,1))
 #  samples[:,0:2,:] *= numpy.pi
@@ -343,6 +575,7 @@ if __name__ == '__main__':
 #  l2 = 0.3
 #  samples[:,2,:] = l1*numpy.cos(samples[:,0,:])+l2*numpy.cos(samples[:,0,:]+samples[:,1,:])
 #  samples[:,3,:] = l1*numpy.sin(samples[:,0,:])+l2*numpy.sin(samples[:,0,:]+samples[:,1,:])
+#  samples = samples.astype(numpy.float32)
   # Affichage des données (pour les ensembles 1, 2 et 3)
   plt.figure()
   plt.scatter(samples[:,0,0], samples[:,1,0])
@@ -373,17 +606,18 @@ if __name__ == '__main__':
   else:
   	# Affichage de la grille initiale
   	network.scatter_plot(False)
-  # Boucle d'apprentissage
-  for i in range(N+1):
-    # Choix d'un exemple aléatoire pour l'entrée courante
-    index = numpy.random.randint(nsamples)
-    x = samples[index].flatten()
-    # Calcul de l'activité du réseau
-    network.compute(x)
-    # Modification des poids du réseau
-    network.learn(ETA,SIGMA,x)
-    # Mise à jour de l'affichage
-    if VERBOSE and i%NAFFICHAGE==0:
+  # Version aplatie et contiguë des données, construite une seule fois avant la boucle
+  # (évite de réaplatir chaque exemple tiré à chacune des N itérations)
+  samples_flat = numpy.ascontiguousarray(samples.reshape(nsamples,-1),dtype=numpy.float32)
+  # Générateur moderne et flux d'indices prétiré pour toute la simulation (un seul appel au RNG au lieu d'un par itération)
+  rng = numpy.random.default_rng()
+  idx_stream = rng.integers(0,nsamples,size=N+1)
+  # Boucle d'apprentissage (i compte les exemples présentés, par pas de B)
+  for i in range(0,N+1,B):
+    # Calcul des vainqueurs et modification des poids du réseau sur le mini-lot courant
+    network.learn_batch(ETA,SIGMA,samples_flat[idx_stream[i:i+B]])
+    # Mise à jour de l'affichage (une fois par tranche de NAFFICHAGE exemples)
+    if VERBOSE and i%NAFFICHAGE<B:
       # Effacement du contenu de la figure
       plt.clf()
       # Remplissage de la figure
@@ -404,31 +638,29 @@ if __name__ == '__main__':
   # Affichage de l'erreur de quantification vectorielle moyenne après apprentissage
   print("erreur de quantification vectorielle moyenne ",network.quantification(samples))
   print("distorsion locale moyenne ",distorsion_locale_moyenne(network))
-  print("rugosite locale moyenne ",compute_local_roughness(numpy.array(network.weightsmap)))
+  print("rugosite locale moyenne ",compute_local_roughness(numpy.asarray(network.weightsmap)))
 
 def carte_de_chaleur_distorsion(network):
     '''
     @summary: Affiche une carte de chaleur des différences locales entre poids de neurones voisins
     '''
-    w = numpy.array(network.weightsmap)
+    w = numpy.asarray(network.weightsmap)
+    # Distances au carré entre voisins verticaux et horizontaux, par tranches de tableau
+    dh2 = ((w[1:] - w[:-1])**2).sum(axis=-1)
+    dv2 = ((w[:, 1:] - w[:, :-1])**2).sum(axis=-1)
+    # Chaque arête contribue aux deux cellules qu'elle relie (pochoir 4-connecté)
     heatmap = numpy.zeros((network.gridsize[0], network.gridsize[1]))
-    for i in range(network.gridsize[0]):
-        for j in range(network.gridsize[1]):
-            dist = 0
-            count = 0
-            if i > 0:
-                dist += numpy.linalg.norm(w[i][j] - w[i-1][j])**2
-                count += 1
-            if i < network.gridsize[0] - 1:
-                dist += numpy.linalg.norm(w[i][j] - w[i+1][j])**2
-                count += 1
-            if j > 0:
-                dist += numpy.linalg.norm(w[i][j] - w[i][j-1])**2
-                count += 1
-            if j < network.gridsize[1] - 1:
-                dist += numpy.linalg.norm(w[i][j] - w[i][j+1])**2
-                count += 1
-            heatmap[i][j] = dist / count if count > 0 else 0
+    heatmap[1:] += dh2
+    heatmap[:-1] += dh2
+    heatmap[:, 1:] += dv2
+    heatmap[:, :-1] += dv2
+    # Nombre de voisins de chaque cellule, construit avec le même pochoir
+    count = numpy.zeros((network.gridsize[0], network.gridsize[1]))
+    count[1:] += 1
+    count[:-1] += 1
+    count[:, 1:] += 1
+    count[:, :-1] += 1
+    heatmap /= numpy.maximum(count, 1)
     plt.figure()
     plt.imshow(heatmap, cmap='hot', interpolation='nearest')
     plt.colorbar()